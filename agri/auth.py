@@ -13,6 +13,38 @@ ACCOUNT_NAME = "github_token"
 # In-memory fallback token storage when keyring fails
 _MEMORY_TOKEN = None
 
+
+# Token read from keyring, kept once found as keyring lookups can be slow
+# (e.g. over DBus on Linux)
+_KEYRING_TOKEN = None
+
+
+def _get_keyring_token() -> Optional[str]:
+    """
+    Get the token stored in keyring.
+    
+    Only a token that was found is cached, so a failed or empty lookup is
+    retried on the next call. Call _clear_keyring_token() when the stored
+    token changes.
+    """
+    global _KEYRING_TOKEN
+    
+    if _KEYRING_TOKEN is None:
+        try:
+            import keyring
+            _KEYRING_TOKEN = keyring.get_password(SERVICE_NAME, ACCOUNT_NAME)
+        except Exception:
+            # Keyring access failed, but we might still have a token elsewhere
+            return None
+    return _KEYRING_TOKEN
+
+
+def _clear_keyring_token() -> None:
+    """Forget the cached keyring token, so it is read again on next use."""
+    global _KEYRING_TOKEN
+    _KEYRING_TOKEN = None
+
+
 def authenticate(token: Optional[str] = None, store: bool = True) -> str:
     """
     Authenticate with GitHub using a personal access token.
@@ -38,12 +70,7 @@ def authenticate(token: Optional[str] = None, store: bool = True) -> str:
             
         # Try to get from keyring (might fail in some environments)
         if token is None:
-            try:
-                import keyring
-                token = keyring.get_password(SERVICE_NAME, ACCOUNT_NAME)
-            except Exception as e:
-                # Keyring access failed, but we can continue
-                pass
+            token = _get_keyring_token()
         
         # Prompt user if still not found
         if token is None:
@@ -64,6 +91,7 @@ def authenticate(token: Optional[str] = None, store: bool = True) -> str:
         try:
             import keyring
             keyring.set_password(SERVICE_NAME, ACCOUNT_NAME, token)
+            _clear_keyring_token()
         except Exception as e:
             warnings.warn(
                 f"Could not store token in keyring: {str(e)}\n"
@@ -89,12 +117,7 @@ def get_token() -> str:
         
     # Try keyring last (might fail in some environments)
     if token is None:
-        try:
-            import keyring
-            token = keyring.get_password(SERVICE_NAME, ACCOUNT_NAME)
-        except Exception:
-            # Keyring access failed, but we might still have a token elsewhere
-            pass
+        token = _get_keyring_token()
     
     if not token:
         raise RuntimeError(
@@ -2,19 +2,74 @@
 Repository browsing functionality with lazy loading.
 """
 import os
+import re
 import sys
 import tempfile
 import shutil
 import importlib.util
+import compileall
 import types
-from typing import Dict, Optional, Any, Union, List, Callable
+import threading
+import concurrent.futures
+import functools
+import fnmatch
+from typing import Dict, Optional, Any, Union, List, Callable, Tuple, Sequence, Iterator, FrozenSet, Set
+from urllib.parse import urlsplit, urlunsplit
 import git
-from tqdm import tqdm
+
+from .auth import get_token, _clear_keyring_token
 
 # Global cache of imported repositories
 _REPO_CACHE: Dict[str, Any] = {}
 _REPO_PATHS: Dict[str, str] = {}  # Store local paths of repositories
 
+# Guards the caches above and _REPO_LOCKS
+_CACHE_LOCK = threading.RLock()
+# Per local path locks, so a repository is never cloned or updated by two threads at once
+_REPO_LOCKS: Dict[str, threading.RLock] = {}
+
+# Shared pool for listing directories concurrently in get_structure
+_STRUCTURE_POOL = concurrent.futures.ThreadPoolExecutor(
+    max_workers=min(32, (os.cpu_count() or 4) * 4), thread_name_prefix="agri-structure")
+
+# Patterns ignored by get_structure unless others are given
+_STRUCTURE_IGNORE_PATTERNS = [".git", "__pycache__", ".pytest_cache", ".ipynb_checkpoints", "venv", "env", ".env"]
+
+# Emoji shown in front of files in get_structure, by lowercase file extension
+_SUFFIX_EMOJI = {
+    ".py": "🐍",
+    ".jpg": "🖼️", ".jpeg": "🖼️", ".png": "🖼️", ".gif": "🖼️", ".bmp": "🖼️",
+    ".json": "📋", ".yaml": "📋", ".yml": "📋", ".toml": "📋", ".xml": "📋",
+    ".md": "📝", ".txt": "📝", ".rst": "📝",
+}
+
+
+class _GitProgress(git.RemoteProgress):
+    """Show the progress of git network operations on a single updating line."""
+    _STAGES = {
+        git.RemoteProgress.COUNTING: "Counting objects",
+        git.RemoteProgress.COMPRESSING: "Compressing objects",
+        git.RemoteProgress.RECEIVING: "Receiving objects",
+        git.RemoteProgress.RESOLVING: "Resolving deltas",
+        git.RemoteProgress.CHECKING_OUT: "Checking out files",
+    }
+    
+    def update(self, op_code, cur_count, max_count=None, message=""):
+        stage = self._STAGES.get(op_code & self.OP_MASK)
+        if stage is None:
+            return
+        
+        if max_count:
+            line = f"{stage}: {int(cur_count) * 100 // int(max_count)}% ({int(cur_count)}/{int(max_count)})"
+        else:
+            line = f"{stage}: {int(cur_count)}"
+        if message:
+            line += f", {message}"
+        
+        # Overwrite the current line and move on once the stage is done
+        end = "\n" if op_code & self.END else ""
+        print(f"\r{line}", end=end, flush=True)
+
 
 class LazyModule:
     """A module that lazily loads its contents when accessed."""
@@ -23,6 +78,8 @@ class LazyModule:
         self.__path__ = path
         self.__loaded__ = False
         self.__dict__["_children"] = {}
+        # Repositories don't change while imported, so check the path type only once
+        self.__dict__["_is_py_file"] = path.endswith(".py") and os.path.isfile(path)
  
         # Scan directory structure but don't execute code
         self._scan_structure()
@@ -31,31 +88,30 @@ class LazyModule:
         """Scan the directory structure without executing code."""
         path = self.__path__
 
-        if os.path.isfile(path) and path.endswith(".py"):
+        if self._is_py_file:
             # It's a Python file - we'll load it when accessed
             pass
         elif os.path.isdir(path):
             # Scan directory for files and subdirectories
-            for item in os.listdir(path):
-                item_path = os.path.join(path, item)
-                
-                # Skip hidden files and directories
-                if item.startswith("."):
-                    continue
-                
-                # Skip __pycache__ and other special directories
-                if item.startswith("__") and item.endswith("__"):
-                    continue
-                
-                if item.endswith(".py"):
-                    # It's a Python file
-                    module_name = item[:-3]
-                    self._children[module_name] = item_path
-                elif os.path.isdir(item_path):
-                    # It's a subdirectory
-                    submodule_name = item
-                    submodule = LazyModule(f"{self.__name__}.{submodule_name}", item_path)
-                    self._children[submodule_name] = submodule
+            with os.scandir(path) as it:
+                for entry in it:
+                    item = entry.name
+                    
+                    # Skip hidden files and directories
+                    if item.startswith("."):
+                        continue
+                    
+                    # Skip __pycache__ and other special directories
+                    if item.startswith("__") and item.endswith("__"):
+                        continue
+                    
+                    if item.endswith(".py") and entry.is_file():
+                        # It's a Python file
+                        module_name = item[:-3]
+                        self._children[module_name] = entry.path
+                    elif entry.is_dir():
+                        # It's a subdirectory - scanned when first accessed
+                        self._children[item] = entry.path
     
     def _load_module(self):
         """Fully load this module if it's a Python file."""
@@ -63,7 +119,7 @@ class LazyModule:
             return
             
         path = self.__path__
-        if os.path.isfile(path) and path.endswith(".py"):
+        if self._is_py_file:
             try:
                 spec = importlib.util.spec_from_file_location(self.__name__, path)
                 if spec is None or spec.loader is None:
@@ -76,10 +132,9 @@ class LazyModule:
                 spec.loader.exec_module(module)
                 
                 # Copy attributes from loaded module to this LazyModule
-                for key, value in module.__dict__.items():
-                    if not key.startswith("__"):
-                        self.__dict__[key] = value
-                        
+                self.__dict__.update((key, value) for key, value in module.__dict__.items()
+                                     if not key.startswith("__"))
+                
                 self.__loaded__ = True
             except Exception as e:
                 print(f"Error loading module {self.__name__}: {e}")
@@ -88,7 +143,7 @@ class LazyModule:
     def __getattr__(self, name):
         """Lazily load modules or return child objects when accessed."""
         # If this is a file module, load it when any attribute is accessed
-        if os.path.isfile(self.__path__) and self.__path__.endswith(".py"):
+        if self._is_py_file:
             self._load_module()
             if name in self.__dict__:
                 return self.__dict__[name]
@@ -98,8 +153,8 @@ class LazyModule:
         if name in self._children:
             child = self._children[name]
             
-            # If child is a path string, it's a Python file that needs to be loaded
-            if isinstance(child, str) and child.endswith(".py"):
+            # If child is a path string, it's a directory or Python file that needs to be loaded
+            if isinstance(child, str):
                 module = LazyModule(f"{self.__name__}.{name}", child)
                 self._children[name] = module  # Cache the module
                 return module
@@ -111,7 +166,7 @@ class LazyModule:
     
     def __dir__(self):
         """List available attributes and submodules."""
-        if os.path.isfile(self.__path__) and self.__path__.endswith(".py"):
+        if self._is_py_file:
             if not self.__loaded__:
                 self._load_module()
             return list(self.__dict__.keys())
@@ -119,7 +174,7 @@ class LazyModule:
             return list(self._children.keys())
             
     def __repr__(self):
-        if os.path.isfile(self.__path__):
+        if self._is_py_file:
             return f"<LazyModule '{self.__name__}' from '{self.__path__}'>"
         else:
             return f"<LazyPackage '{self.__name__}' from '{self.__path__}'>"
@@ -127,7 +182,6 @@ class LazyModule:
 
 def _get_repo_url(repo_path: str) -> str:
     """Convert repo path to URL with auth token."""
-    from .auth import get_token
     
     # If it's already a full URL
     if repo_path.startswith("http"):
@@ -136,46 +190,212 @@ def _get_repo_url(repo_path: str) -> str:
         # Assume it's in the format username/repo_name
         base_url = f"https://github.com/{repo_path}.git"
     
-    # Add token for authentication
+    # Add token for authentication, replacing any credentials already in the URL
+    parts = urlsplit(base_url)
+    if parts.scheme != "https":
+        return base_url
     token = get_token()
-    auth_url = base_url.replace("https://", f"https://{token}@")
+    host = parts.netloc.rpartition("@")[2]
+    auth_url = urlunsplit(parts._replace(netloc=f"{token}@{host}"))
     
     return auth_url
 
 
+def _get_repo_name(repo_path: str) -> str:
+    """Get the repository name from its path (username/repo_name) or URL."""
+    repo_name = repo_path.split("/")[-1]
+    if repo_name.endswith(".git"):
+        repo_name = repo_name[:-4]
+    return repo_name
+
+
+def _get_repo_lock(local_path: str) -> threading.RLock:
+    """Get the lock for cloning or updating the repository at a local path."""
+    with _CACHE_LOCK:
+        return _REPO_LOCKS.setdefault(local_path, threading.RLock())
+
+
 def _get_local_path(repo_name: str) -> str:
     """Get local path for storing the repository."""
-    # Create a unique path in the temp directory
+    return os.path.join(_get_cache_dir(), repo_name)
+
+
+def _get_cache_dir() -> str:
+    """
+    Get the directory that repositories are cloned into.
+    
+    Clones are kept in a persistent cache directory so they survive restarts and
+    can be updated in place: $AGRI_CACHE_DIR, else $XDG_CACHE_HOME/agri, else
+    ~/.cache/agri. The temp directory is used if none of these is writable.
+    """
+    candidates = []
+    if os.environ.get("AGRI_CACHE_DIR"):
+        candidates.append(os.environ["AGRI_CACHE_DIR"])
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    candidates.append(os.path.join(cache_home, "agri"))
+    
+    for base_dir in candidates:
+        try:
+            os.makedirs(base_dir, exist_ok=True)
+        except OSError:
+            continue
+        if os.access(base_dir, os.W_OK):
+            return base_dir
+    
+    # Last resort: the temp directory
     base_dir = os.path.join(tempfile.gettempdir(), "agri")
     os.makedirs(base_dir, exist_ok=True)
-    return os.path.join(base_dir, repo_name)
+    return base_dir
+
+
+def _git_env() -> Dict[str, str]:
+    """
+    Get the environment for network git commands.
+    
+    Uses protocol v2 (equivalent to `git -c protocol.version=2`), keeping any
+    config the caller already passes through GIT_CONFIG_PARAMETERS, and fails
+    instead of prompting for credentials.
+    """
+    config = os.environ.get("GIT_CONFIG_PARAMETERS", "")
+    return {
+        "GIT_CONFIG_PARAMETERS": f"{config} 'protocol.version=2'".lstrip(),
+        "GIT_TERMINAL_PROMPT": "0",
+    }
+
+
+def _strip_auth(url: str) -> str:
+    """Remove credentials from a repository URL so URLs can be compared."""
+    parts = urlsplit(url)
+    return urlunsplit(parts._replace(netloc=parts.netloc.rpartition("@")[2]))
 
 
-def _clone_repo(repo_path: str, branch: str = "main") -> str:
-    """Clone a repository to local storage."""
-    # Parse repo name from path
-    if "/" in repo_path:
-        repo_name = repo_path.split("/")[-1]
+def _sync_repo(repo: git.Repo, branch: str = "main", depth: Optional[int] = 1) -> bool:
+    """
+    Fetch a branch from origin and reset the working tree to it.
+
+    Args:
+        repo: The local repository
+        branch: The branch to fetch
+        depth: Number of commits of history to fetch for shallow clones
+
+    Returns:
+        True if the checked out commit changed, False if it was already up to date.
+    """
+    old_sha = repo.head.commit.hexsha
+    
+    # Keep shallow clones shallow, fetch normally otherwise
+    fetch_kwargs = {}
+    if os.path.exists(os.path.join(repo.git_dir, "shallow")):
+        if depth:
+            fetch_kwargs["depth"] = depth
+        else:
+            fetch_kwargs["unshallow"] = True
+    
+    # Fetch only the requested branch in-process over protocol v2
+    with repo.git.custom_environment(**_git_env()):
+        repo.remote(name="origin").fetch(
+            refspec=f"+refs/heads/{branch}:refs/remotes/origin/{branch}",
+            progress=_GitProgress(), **fetch_kwargs)
+    
+    # Move the working tree to the fetched commit and drop untracked files,
+    # keeping ignored ones (bytecode from _precompile, downloaded data, ...)
+    if not _is_on_branch(repo, branch):
+        repo.git.checkout("-f", "-B", branch, f"origin/{branch}")
     else:
-        repo_name = repo_path
+        repo.git.reset("--hard", f"origin/{branch}")
+    repo.git.clean("-fd", "-e", "__pycache__")
     
-    if repo_name.endswith(".git"):
-        repo_name = repo_name[:-4]
+    return repo.head.commit.hexsha != old_sha
+
+
+def _open_clone(local_path: str, auth_url: str) -> Optional[git.Repo]:
+    """
+    Open an existing local clone, if it can be reused.
+    
+    Returns:
+        The repository, or None if it is not a git repository, has another
+        origin or has no commits, in which case it has to be cloned again.
+    """
+    try:
+        repo = git.Repo(local_path)
+        origin = repo.remote(name="origin")
+    except (git.exc.InvalidGitRepositoryError, git.exc.NoSuchPathError, ValueError):
+        # Not a git repository, or it has no origin
+        return None
+    
+    if _strip_auth(origin.url) != _strip_auth(auth_url) or not repo.head.is_valid():
+        return None
+    return repo
+
+
+def _is_on_branch(repo: git.Repo, branch: str) -> bool:
+    """Check whether a repository has the given branch checked out."""
+    return not repo.head.is_detached and repo.active_branch.name == branch
+
+
+def _clone_repo(repo_path: str, branch: str = "main", depth: Optional[int] = 1) -> str:
+    """
+    Clone a repository to local storage.
+
+    Args:
+        repo_path: The path to the repository (username/repo_name)
+        branch: The branch to clone
+        depth: Number of commits of history to fetch (None or 0 for full history)
+
+    Returns:
+        The local path of the cloned repository.
+    """
+    repo_name = _get_repo_name(repo_path)
     
     # Get URLs and paths
     auth_url = _get_repo_url(repo_path)
     local_path = _get_local_path(repo_name)
     
-    # Remove existing directory if it exists
     if os.path.exists(local_path):
+        # Reuse an existing clone of the same repository instead of cloning again
+        repo = _open_clone(local_path, auth_url)
+        if repo is not None:
+            repo.remote(name="origin").set_url(auth_url)
+            try:
+                _sync_repo(repo, branch, depth)
+            except git.exc.GitCommandError as e:
+                # E.g. no network - keep the local copy if it already has the
+                # requested branch checked out, rather than losing it
+                if not _is_on_branch(repo, branch):
+                    raise
+                print(f"⚠️ Could not update {repo_path}, using the existing local copy: {e}")
+            return local_path
+        
+        # Remove existing directory
         shutil.rmtree(local_path)
     
+    # Only fetch the requested branch, without tags, and a shallow history
+    multi_options = []
+    if depth:
+        multi_options.extend([f"--depth={depth}", "--single-branch", "--no-tags"])
+    
     # Clone the repository
-    git.Repo.clone_from(auth_url, local_path, branch=branch)
+    git.Repo.clone_from(auth_url, local_path, branch=branch, multi_options=multi_options,
+                        env=_git_env(), progress=_GitProgress())
     
     return local_path
 
 
+def _precompile(local_path: str) -> None:
+    """Compile the repository's Python files to bytecode so imports skip parsing."""
+    # Skip files inside .git and other hidden directories of the repository
+    hidden = re.compile(re.escape(os.path.join(local_path, "")) + r"(.*[\\/])?\.")
+    
+    # compileall spreads the files over a process pool; on Windows starting
+    # worker processes costs more than it saves, so compile serially there
+    workers = 1 if os.name == "nt" else (os.cpu_count() or 1)
+    
+    # Precompiling is best effort: files that don't compile are skipped silently,
+    # and importing them still reports the error from _load_module
+    compileall.compile_dir(local_path, quiet=2, workers=workers, rx=hidden,
+                           legacy=False, optimize=-1)
+
+
 def commit_files(repo_path: str, 
                 local_source: Union[str, Dict[str, str]], 
                 repo_target: str = "", 
@@ -197,14 +417,7 @@ def commit_files(repo_path: str,
     Returns:
         True if successful, False otherwise
     """
-    # Parse repo name from path
-    if "/" in repo_path:
-        repo_name = repo_path.split("/")[-1]
-    else:
-        repo_name = repo_path
-    
-    if repo_name.endswith(".git"):
-        repo_name = repo_name[:-4]
+    repo_name = _get_repo_name(repo_path)
     
     local_repo_path = _get_local_path(repo_name)
     
@@ -232,7 +445,7 @@ def commit_files(repo_path: str,
                 # Branch doesn't exist locally, try to find it on remote
                 try:
                     print(f"🔍 Branch '{branch}' not found locally, checking remote...")
-                    repo.git.fetch('origin', branch)
+                    repo.git.fetch('origin', f'+refs/heads/{branch}:refs/remotes/origin/{branch}')
                     repo.git.checkout('-b', branch, f'origin/{branch}')
                 except git.exc.GitCommandError:
                     # Branch doesn't exist remotely either, create it
@@ -373,14 +586,7 @@ def create_file_and_commit(repo_path: str,
     Returns:
         True if successful, False otherwise
     """
-    # Parse repo name from path
-    if "/" in repo_path:
-        repo_name = repo_path.split("/")[-1]
-    else:
-        repo_name = repo_path
-    
-    if repo_name.endswith(".git"):
-        repo_name = repo_name[:-4]
+    repo_name = _get_repo_name(repo_path)
     
     local_repo_path = _get_local_path(repo_name)
     
@@ -408,7 +614,7 @@ def create_file_and_commit(repo_path: str,
                 # Branch doesn't exist locally, try to find it on remote
                 try:
                     print(f"🔍 Branch '{branch}' not found locally, checking remote...")
-                    repo.git.fetch('origin', branch)
+                    repo.git.fetch('origin', f'+refs/heads/{branch}:refs/remotes/origin/{branch}')
                     repo.git.checkout('-b', branch, f'origin/{branch}')
                 except git.exc.GitCommandError:
                     # Branch doesn't exist remotely either, create it
@@ -483,14 +689,7 @@ def delete_files_and_commit(repo_path: str,
     if isinstance(repo_file_paths, str):
         repo_file_paths = [repo_file_paths]
         
-    # Parse repo name from path
-    if "/" in repo_path:
-        repo_name = repo_path.split("/")[-1]
-    else:
-        repo_name = repo_path
-    
-    if repo_name.endswith(".git"):
-        repo_name = repo_name[:-4]
+    repo_name = _get_repo_name(repo_path)
     
     local_repo_path = _get_local_path(repo_name)
     
@@ -516,7 +715,7 @@ def delete_files_and_commit(repo_path: str,
                 repo.git.checkout(branch)
             except git.exc.GitCommandError:
                 try:
-                    repo.git.fetch('origin', branch)
+                    repo.git.fetch('origin', f'+refs/heads/{branch}:refs/remotes/origin/{branch}')
                     repo.git.checkout('-b', branch, f'origin/{branch}')
                 except git.exc.GitCommandError:
                     print(f"🌱 Creating new branch '{branch}'")
@@ -568,7 +767,8 @@ def delete_files_and_commit(repo_path: str,
     except Exception as e:
         print(f"❌ Error deleting files and committing: {e}")
         return False
-def import_repo(repo_path: str, branch: str = "main", show_structure: bool = True) -> LazyModule:
+def import_repo(repo_path: str, branch: str = "main", show_structure: bool = True,
+                depth: Optional[int] = 1, precompile: bool = True) -> LazyModule:
     """
     Import a GitHub repository as a lazily-loaded module structure.
     
@@ -576,136 +776,288 @@ def import_repo(repo_path: str, branch: str = "main", show_structure: bool = Tru
         repo_path: The path to the repository (username/repo_name)
         branch: The branch to import (default: "main")
         show_structure: Whether to print the repository structure after importing
+        depth: Number of commits of history to clone (default: 1, None for full history)
+        precompile: Whether to compile the repository's Python files to bytecode after cloning
         
     Returns:
         A LazyModule object representing the repository.
     """
     # Check if already in cache
     cache_key = f"{repo_path}:{branch}"
-    if cache_key in _REPO_CACHE:
-        module = _REPO_CACHE[cache_key]
-        print(f"✨ Using cached repository {repo_path} (branch: {branch})")
-        
-        if show_structure and cache_key in _REPO_PATHS:
-            print("\n📂 Repository structure:")
-            print(get_structure(_REPO_PATHS[cache_key]))
+    with _CACHE_LOCK:
+        module = _REPO_CACHE.get(cache_key)
+    
+    if module is None:
+        # Only one thread clones into a local path at a time. Threads that waited
+        # for another import of the same repository use its cached result.
+        with _get_repo_lock(_get_local_path(_get_repo_name(repo_path))):
+            with _CACHE_LOCK:
+                module = _REPO_CACHE.get(cache_key)
             
-        return module
+            if module is None:
+                # Clone the repository
+                print(f"🚀 Importing repository {repo_path} (branch: {branch})...")
+                local_path = _clone_repo(repo_path, branch, depth=depth)
+                
+                return _load_repo(repo_path, branch, local_path, show_structure, precompile)
     
-    # Clone the repository
-    print(f"🚀 Importing repository {repo_path} (branch: {branch})...")
-    local_path = _clone_repo(repo_path, branch)
+    print(f"✨ Using cached repository {repo_path} (branch: {branch})")
     
-    print(f"📦 Processing repository content...")
-    with tqdm(total=100, desc="Building module structure", ascii=True) as pbar:
-        # Parse repo name from path for the module name
-        if "/" in repo_path:
-            repo_name = repo_path.split("/")[-1]
-        else:
-            repo_name = repo_path
-        
-        if repo_name.endswith(".git"):
-            repo_name = repo_name[:-4]
-        
-        pbar.update(50)  # Update progress
-        
-        # Create lazy module for the repository
-        module = LazyModule(repo_name, local_path)
-        pbar.update(50)  # Update progress to 100%
+    with _CACHE_LOCK:
+        local_path = _REPO_PATHS.get(cache_key)
+    if show_structure and local_path is not None:
+        print("\n📂 Repository structure:")
+        print(get_structure(local_path))
         
-        # Store in cache
+    return module
+
+
+def _load_repo(repo_path: str, branch: str, local_path: str,
+               show_structure: bool = True, precompile: bool = True) -> LazyModule:
+    """Build and cache the LazyModule for a repository that is available locally."""
+    cache_key = f"{repo_path}:{branch}"
+    print(f"📦 Processing repository content...")
+    
+    repo_name = _get_repo_name(repo_path)
+    
+    # Create lazy module for the repository
+    module = LazyModule(repo_name, local_path)
+    
+    # Store in cache
+    with _CACHE_LOCK:
         _REPO_CACHE[cache_key] = module
         _REPO_PATHS[cache_key] = local_path
-        
-        if show_structure:
-            print("\n📂 Repository structure:")
-            print(get_structure(local_path))
-        
-        return module
+    
+    if show_structure:
+        print("\n📂 Repository structure:")
+        print(get_structure(local_path))
+    
+    if precompile:
+        _precompile(local_path)
+    
+    return module
 
 
-def get_structure(path: str, prefix: str = "", ignore_patterns: List[str] = None) -> str:
+def get_structure(path: str, prefix: str = "", ignore_patterns: List[str] = None,
+                  follow_symlinks: bool = False) -> str:
     """
     Get a string representation of the directory structure.
     
     Args:
         path: Path to the directory
-        prefix: Prefix for the current line (used for recursion)
-        ignore_patterns: List of patterns to ignore (e.g. [".git", "__pycache__"])
+        prefix: Prefix for every line of the structure
+        ignore_patterns: Names to ignore (e.g. [".git", "__pycache__"]); patterns
+                         containing *, ? or [ are matched as globs (e.g. "*.pyc")
+        follow_symlinks: Whether to descend into symlinked directories
         
     Returns:
         A formatted string showing the directory structure
     """
     if ignore_patterns is None:
-        ignore_patterns = [".git", "__pycache__", ".pytest_cache", ".ipynb_checkpoints", "venv", "env", ".env"]
+        ignore_patterns = _STRUCTURE_IGNORE_PATTERNS
     
     if not os.path.exists(path):
         return f"{prefix}Path does not exist: {path}"
     
-    if os.path.isfile(path):
-        return f"{prefix}└── {os.path.basename(path)}"
+    ignore_patterns = tuple(ignore_patterns)
     
-    result = []
+    # Symlinked directories may point outside the repository, so their changes can't be tracked
+    state = None if follow_symlinks else _structure_state(path, _split_ignore_patterns(ignore_patterns))
+    if state is None:
+        return "\n".join(get_structure_iter(path, prefix, ignore_patterns, follow_symlinks))
+    
+    return _get_structure_cached(path, prefix, ignore_patterns, follow_symlinks, state)
+
+
+def _structure_state(path: str, ignore: Tuple[FrozenSet[str], Tuple[str, ...]]) -> Optional[str]:
+    """
+    Identify the state of a path whose structure can be cached.
+    
+    Only the roots of git repositories with a clean working tree are cached,
+    keyed on their HEAD commit. Any change git reports (modified, deleted,
+    untracked or ignored files) means the structure has to be built again,
+    unless it is inside an item the structure ignores, like __pycache__.
+    
+    Checking this runs git status, so even a cache hit costs a subprocess;
+    it only saves the walk and formatting of the tree.
+    
+    Returns:
+        The state to use as cache key, or None if the structure can't be cached.
+    """
+    try:
+        repo = git.Repo(path)
+        head_sha = repo.head.commit.hexsha
+        status = repo.git.status("--porcelain", "--ignored", "-z")
+    except (git.exc.InvalidGitRepositoryError, git.exc.NoSuchPathError,
+            git.exc.GitCommandError, ValueError):
+        # Not the root of a git repository (or it has no commits yet)
+        return None
+    
+    entries = iter(status.split("\0"))
+    for entry in entries:
+        if not entry:
+            continue
+        if "R" in entry[:2] or "C" in entry[:2]:
+            # Renames and copies are followed by their original path
+            next(entries, None)
+        
+        # Changes inside items the structure leaves out don't affect it
+        parts = entry[3:].rstrip("/").split("/")
+        if not any(_is_ignored(part, ignore) for part in parts):
+            return None
+    
+    # git does not track empty directories, so also use the root directory's mtime
+    return f"{head_sha}:{os.stat(path).st_mtime_ns}"
+
+
+@functools.lru_cache(maxsize=64)
+def _get_structure_cached(path: str, prefix: str, ignore_patterns: Tuple[str, ...],
+                          follow_symlinks: bool, state: str) -> str:
+    """Build the structure string for get_structure. state is only used as part of the cache key."""
+    return "\n".join(get_structure_iter(path, prefix, ignore_patterns, follow_symlinks))
+
+
+def get_structure_iter(path: str, prefix: str = "", ignore_patterns: Sequence[str] = None,
+                       follow_symlinks: bool = False) -> Iterator[str]:
+    """
+    Yield the lines of the directory structure one at a time.
+    
+    This walks the tree with an explicit stack, so deep trees don't hit the
+    recursion limit and lines can be printed before the walk has finished.
+    
+    Args:
+        path: Path to the directory
+        prefix: Prefix for every line of the structure
+        ignore_patterns: Names to ignore (e.g. [".git", "__pycache__"]); patterns
+                         containing *, ? or [ are matched as globs (e.g. "*.pyc")
+        follow_symlinks: Whether to descend into symlinked directories. Each directory
+                         is shown at most once, so symlink loops are not walked again.
+        
+    Yields:
+        The lines of the formatted directory structure
+    """
+    if ignore_patterns is None:
+        ignore_patterns = _STRUCTURE_IGNORE_PATTERNS
+    
+    if not os.path.exists(path):
+        yield f"{prefix}Path does not exist: {path}"
+        return
+    
+    if os.path.isfile(path):
+        yield f"{prefix}└── {os.path.basename(path)}"
+        return
     
     if prefix == "":
-        result.append(f"📁 {os.path.basename(path)}")
+        yield f"📁 {os.path.basename(path)}"
         prefix = "   "
     
-    # Get all items in the directory
-    items = [item for item in sorted(os.listdir(path)) 
-             if not any(pattern in item for pattern in ignore_patterns)]
-    
-    # Process directories first, then files
-    dirs = [item for item in items if os.path.isdir(os.path.join(path, item))]
-    files = [item for item in items if os.path.isfile(os.path.join(path, item))]
+    ignore = _split_ignore_patterns(ignore_patterns)
     
-    # Keep track of processed items
-    total_items = len(dirs) + len(files)
-    processed_items = 0
+    # Without following symlinks the tree has no cycles; otherwise track the
+    # (device, inode) of every directory walked so far
+    visited = None
+    if follow_symlinks:
+        st = os.stat(path)
+        visited = {(st.st_dev, st.st_ino)}
     
-    # Process directories
-    for i, item in enumerate(dirs):
-        processed_items += 1
-        item_path = os.path.join(path, item)
+    # Directories still being printed, deepest last
+    stack = [_structure_frame(path, prefix, _list_dir(path, ignore, follow_symlinks), ignore, visited)]
+    while stack:
+        dir_path, dir_prefix, entries = stack[-1]
+        entry = next(entries, None)
+        if entry is None:
+            stack.pop()
+            continue
         
-        if processed_items == total_items:  # Last item
-            result.append(f"{prefix}└── 📁 {item}")
-            result.append(get_structure(item_path, prefix + "    ", ignore_patterns))
-        else:
-            result.append(f"{prefix}├── 📁 {item}")
-            result.append(get_structure(item_path, prefix + "│   ", ignore_patterns))
-    
-    # Process files
-    for i, item in enumerate(files):
-        processed_items += 1
-        
-        if processed_items == total_items:  # Last item
-            if item.endswith(".py"):
-                result.append(f"{prefix}└── 🐍 {item}")
-            elif item.endswith((".jpg", ".png", ".gif", ".bmp", ".jpeg")):
-                result.append(f"{prefix}└── 🖼️ {item}")
-            elif item.endswith((".json", ".yaml", ".yml", ".toml", ".xml")):
-                result.append(f"{prefix}└── 📋 {item}")
-            elif item.endswith((".md", ".txt", ".rst")):
-                result.append(f"{prefix}└── 📝 {item}")
-            else:
-                result.append(f"{prefix}└── 📄 {item}")
+        item, is_last, listing = entry
+        connector = "└──" if is_last else "├──"
+        
+        if listing is None:
+            # It's a file
+            emoji = _SUFFIX_EMOJI.get(os.path.splitext(item)[1].lower(), "📄")
+            yield f"{dir_prefix}{connector} {emoji} {item}"
         else:
-            if item.endswith(".py"):
-                result.append(f"{prefix}├── 🐍 {item}")
-            elif item.endswith((".jpg", ".png", ".gif", ".bmp", ".jpeg")):
-                result.append(f"{prefix}├── 🖼️ {item}")
-            elif item.endswith((".json", ".yaml", ".yml", ".toml", ".xml")):
-                result.append(f"{prefix}├── 📋 {item}")
-            elif item.endswith((".md", ".txt", ".rst")):
-                result.append(f"{prefix}├── 📝 {item}")
-            else:
-                result.append(f"{prefix}├── 📄 {item}")
+            # It's a directory - print its contents before moving on
+            yield f"{dir_prefix}{connector} 📁 {item}"
+            child_prefix = dir_prefix + ("    " if is_last else "│   ")
+            stack.append(_structure_frame(os.path.join(dir_path, item), child_prefix,
+                                          listing.result(), ignore, visited))
+
+
+def _split_ignore_patterns(ignore_patterns: Sequence[str]) -> Tuple[FrozenSet[str], Tuple[str, ...]]:
+    """Split ignore patterns into exact names and glob patterns (those containing *, ? or [)."""
+    globs = tuple(pattern for pattern in ignore_patterns if any(c in pattern for c in "*?["))
+    names = frozenset(pattern for pattern in ignore_patterns if pattern not in globs)
+    return names, globs
+
+
+def _is_ignored(name: str, ignore: Tuple[FrozenSet[str], Tuple[str, ...]]) -> bool:
+    """Check whether a file or directory name matches split ignore patterns."""
+    ignore_names, ignore_globs = ignore
+    # Exact names (".git", "__pycache__", ...) need a single set lookup
+    return name in ignore_names or any(fnmatch.fnmatch(name, pattern) for pattern in ignore_globs)
+
+
+def _list_dir(path: str, ignore: Tuple[FrozenSet[str], Tuple[str, ...]],
+              follow_symlinks: bool = False) -> Tuple[List[str], List[str]]:
+    """List the sorted subdirectory and file names of a directory, skipping ignored items."""
+    dirs = []
+    files = []
+    with os.scandir(path) as it:
+        for entry in it:
+            if _is_ignored(entry.name, ignore):
+                continue
+            if entry.is_dir(follow_symlinks=follow_symlinks):
+                dirs.append(entry.name)
+            elif entry.is_file():
+                files.append(entry.name)
+    
+    dirs.sort()
+    files.sort()
+    return dirs, files
+
+
+def _structure_frame(path: str, prefix: str, listing: Tuple[List[str], List[str]],
+                     ignore: Tuple[FrozenSet[str], Tuple[str, ...]],
+                     visited: Optional[Set[Tuple[int, int]]] = None) -> Tuple[str, str, Iterator[tuple]]:
+    """
+    Prepare a listed directory for get_structure_iter.
+    
+    Returns the path, the prefix and an iterator of (name, is_last, listing)
+    entries, directories first. listing is None for files, and for directories
+    a future of their own listing, which is started here so that all
+    subdirectories are listed concurrently. Only the walking thread waits on
+    these futures, so pool workers never block each other.
+    
+    If visited is given, symlinks are followed and directories whose
+    (device, inode) is already in visited are left out.
+    """
+    dirs, files = listing
+    follow_symlinks = visited is not None
+    
+    if follow_symlinks:
+        unvisited = []
+        for item in dirs:
+            st = os.stat(os.path.join(path, item))
+            key = (st.st_dev, st.st_ino)
+            if key not in visited:
+                visited.add(key)
+                unvisited.append(item)
+        dirs = unvisited
+    
+    total_items = len(dirs) + len(files)
+    
+    entries = [(item, i == total_items - 1,
+                _STRUCTURE_POOL.submit(_list_dir, os.path.join(path, item), ignore, follow_symlinks))
+               for i, item in enumerate(dirs)]
+    entries.extend((item, i == total_items - 1, None)
+                   for i, item in enumerate(files, start=len(dirs)))
     
-    return "\n".join(result)
+    return path, prefix, iter(entries)
 
 
-def update_repo(repo_path: str, branch: str = "main", show_structure: bool = True) -> LazyModule:
+def update_repo(repo_path: str, branch: str = "main", show_structure: bool = True,
+                depth: Optional[int] = 1, precompile: bool = True) -> LazyModule:
     """
     Update a previously imported GitHub repository.
     
@@ -713,75 +1065,77 @@ def update_repo(repo_path: str, branch: str = "main", show_structure: bool = Tru
         repo_path: The path to the repository (username/repo_name)
         branch: The branch to update (default: "main")
         show_structure: Whether to print the repository structure after updating
+        depth: Number of commits of history to fetch for shallow clones (default: 1)
+        precompile: Whether to recompile the repository's Python files to bytecode after updating
         
     Returns:
         The updated LazyModule object representing the repository.
     """
-    # Parse repo name from path
-    if "/" in repo_path:
-        repo_name = repo_path.split("/")[-1]
-    else:
-        repo_name = repo_path
-    
-    if repo_name.endswith(".git"):
-        repo_name = repo_name[:-4]
+    repo_name = _get_repo_name(repo_path)
     
     local_path = _get_local_path(repo_name)
     
-    # Check if repository exists locally
-    if not os.path.exists(local_path):
-        print(f"⚠️ Repository {repo_path} not found locally. Cloning fresh copy...")
-        return import_repo(repo_path, branch, show_structure)
-    
-    print(f"🔄 Updating repository {repo_path} (branch: {branch})...")
+    cache_key = f"{repo_path}:{branch}"
     
-    try:
-        # Update the local repository
-        repo = git.Repo(local_path)
+    # Don't let other threads import or update this repository meanwhile
+    with _get_repo_lock(local_path):
+        # Check if repository exists locally
+        if not os.path.exists(local_path):
+            print(f"⚠️ Repository {repo_path} not found locally. Cloning fresh copy...")
+            return import_repo(repo_path, branch, show_structure, depth, precompile)
+        
+        print(f"🔄 Updating repository {repo_path} (branch: {branch})...")
         
-        # Update remote URL with token
         auth_url = _get_repo_url(repo_path)
-        origin = repo.remote(name="origin")
-        origin.set_url(auth_url)
+        repo = _open_clone(local_path, auth_url)
+        if repo is None:
+            # The local copy can't be updated, so replace it with a fresh clone
+            print(f"⚠️ Local copy of {repo_path} is unusable. Cloning fresh copy...")
+            shutil.rmtree(local_path, ignore_errors=True)
+            with _CACHE_LOCK:
+                for key, path in list(_REPO_PATHS.items()):
+                    if path == local_path:
+                        _REPO_PATHS.pop(key)
+                        _REPO_CACHE.pop(key, None)
+            _get_structure_cached.cache_clear()
+            return import_repo(repo_path, branch, show_structure, depth, precompile)
         
-        # Pull changes with progress bar
-        with tqdm(total=100, desc=f"Updating {repo_name}", ascii=True) as pbar:
-            # Checkout branch
-            repo.git.checkout(branch)
-            pbar.update(30)
-            
-            # Check for changes first
-            repo.git.fetch()
-            pbar.update(30)
-            
-            # Show progress during pull
-            result = repo.git.pull()
-            pbar.update(40)
-            
-            if "Already up to date" in result:
-                print(f"✅ Repository {repo_path} is already up to date")
-            else:
-                print(f"✅ Repository {repo_path} updated successfully")
+        # Update remote URL with token
+        repo.remote(name="origin").set_url(auth_url)
+        
+        try:
+            # Fetch and reset to the latest commit
+            updated = _sync_repo(repo, branch, depth)
+        except git.exc.GitCommandError as e:
+            # Keep the clone (and anything already imported from it), the
+            # failure is usually the network or the credentials
+            print(f"❌ Error updating repository: {e}")
+            # The stored token may have been rotated, so read it again next time
+            _clear_keyring_token()
+            raise
+        
+        if updated:
+            print(f"✅ Repository {repo_path} updated successfully")
+        else:
+            print(f"✅ Repository {repo_path} is already up to date")
         
         # Clear the repository from cache
-        cache_key = f"{repo_path}:{branch}"
-        if cache_key in _REPO_CACHE:
-            del _REPO_CACHE[cache_key]
+        with _CACHE_LOCK:
+            _REPO_CACHE.pop(cache_key, None)
         
-        # Reimport the repository
-        return import_repo(repo_path, branch, show_structure)
-    except git.exc.GitCommandError as e:
-        print(f"❌ Error updating repository: {e}")
-        print("⚠️ Attempting to clone fresh copy...")
-        shutil.rmtree(local_path, ignore_errors=True)
-        return import_repo(repo_path, branch, show_structure)
+        # Rebuild the module from the updated working tree
+        _get_structure_cached.cache_clear()
+        return _load_repo(repo_path, branch, local_path, show_structure, precompile)
+
+
 def get_repo_structure(repo_name: Union[str, LazyModule], ignore_patterns: List[str] = None) -> str:
     """
     Get the structure of an imported repository.
     
     Args:
         repo_name: The name of the repository (string) or a LazyModule object
-        ignore_patterns: List of patterns to ignore (e.g. [".git", "__pycache__"])
+        ignore_patterns: Names to ignore (e.g. [".git", "__pycache__"]); patterns
+                         containing *, ? or [ are matched as globs (e.g. "*.pyc")
         
     Returns:
         A formatted string showing the directory structure
@@ -801,27 +1155,24 @@ def get_repo_structure(repo_name: Union[str, LazyModule], ignore_patterns: List[
     # It's a string, process as before
     if isinstance(repo_name, str):
         # Extract the short name from the full path if needed
-        if "/" in repo_name:
-            repo_short_name = repo_name.split("/")[-1]
-        else:
-            repo_short_name = repo_name
-            
-        if repo_short_name.endswith(".git"):
-            repo_short_name = repo_short_name[:-4]
+        repo_short_name = _get_repo_name(repo_name)
+        
+        with _CACHE_LOCK:
+            repo_paths = list(_REPO_PATHS.items())
         
         # Try finding by direct name match first
-        for cache_key, path in _REPO_PATHS.items():
+        for cache_key, path in repo_paths:
             if f"{repo_name}:" in cache_key or f"/{repo_short_name}:" in cache_key:
                 print(f"📂 Repository structure for {repo_name}:")
                 return get_structure(path, ignore_patterns=ignore_patterns)
         
         # If not found by direct match, try partial match
-        for cache_key, path in _REPO_PATHS.items():
+        for cache_key, path in repo_paths:
             if repo_short_name in cache_key:
                 print(f"📂 Repository structure for {repo_name}:")
                 return get_structure(path, ignore_patterns=ignore_patterns)
         
-        # If not found in cache, try to find it in the temporary directory
+        # If not found in cache, try to find it in the local clone directory
         local_path = _get_local_path(repo_short_name)
         if os.path.exists(local_path):
             print(f"📂 Repository structure for {repo_name} (from local path):")
@@ -838,7 +1189,10 @@ def list_imported_repos() -> List[str]:
         A list of repository names that have been imported.
     """
     repos = []
-    for cache_key in _REPO_CACHE.keys():
+    with _CACHE_LOCK:
+        cache_keys = list(_REPO_CACHE.keys())
+    
+    for cache_key in cache_keys:
         # cache_key is in format "owner/repo:branch"
         repo_info = cache_key.split(':')
         if len(repo_info) >= 2:
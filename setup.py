@@ -27,6 +27,5 @@ setup(
     install_requires=[
         "gitpython",
         "keyring",
-        "tqdm",
     ],
 )
\ No newline at end of file